@@ -25,8 +25,25 @@ DATABASE_URL = urlunparse(parsed._replace(scheme=scheme, query=clean_query))
 
 connect_args = {"ssl": ssl.create_default_context()} if _needs_ssl else {}
 
+# Neon's pooled endpoints ("-pooler" hosts) run PgBouncer in transaction
+# mode, which can't track asyncpg's prepared statements across connections.
+if "-pooler" in (parsed.hostname or ""):
+    connect_args["statement_cache_size"] = 0
+    connect_args["prepared_statement_cache_size"] = 0
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
 engine = create_async_engine(
-    DATABASE_URL, echo=False, pool_pre_ping=True, connect_args=connect_args
+    DATABASE_URL,
+    echo=False,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=30,
+    # Recycle before Neon drops idle connections
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    connect_args=connect_args,
 )
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
@@ -1,16 +1,68 @@
-import base64
-import json
+import asyncio
+import hashlib
+import logging
 import os
+import random
+from typing import Optional, Tuple
 
 import httpx
+import orjson
+from cachetools import TTLCache
 
 from .schemas import AnalysisResult
 
+__all__ = ["analyze_resume", "upload_pdf", "init_client", "close_client"]
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+
+if not GEMINI_API_KEY:
+    raise RuntimeError("GEMINI_API_KEY environment variable is required.")
+
 _GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 GEMINI_URL = (
     f"https://generativelanguage.googleapis.com/v1beta"
     f"/models/{_GEMINI_MODEL}:generateContent"
 )
+_GEMINI_ENDPOINT = f"{GEMINI_URL}?key={GEMINI_API_KEY}"
+GEMINI_UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+
+# Resumes are uploaded once via the Files API and referenced by URI, so
+# re-running the same PDF against new job descriptions skips the upload.
+# Google deletes uploaded files after 48 hours; keep well inside that.
+FILE_CACHE_TTL = 24 * 60 * 60  # seconds
+_file_uri_cache: TTLCache = TTLCache(maxsize=256, ttl=FILE_CACHE_TTL)
+
+# Transient Gemini failures (rate limiting / overload) are retried with
+# exponential backoff plus jitter, honouring any Retry-After header.
+GEMINI_MAX_ATTEMPTS = 3
+_RETRY_BASE_DELAY = 1.0  # seconds
+_RETRY_MAX_DELAY = 30.0  # seconds
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Shared client so repeat analyses reuse the TLS connection to Google.
+# Created and closed by the FastAPI lifespan in main.py.
+_client: Optional[httpx.AsyncClient] = None
+
+
+async def init_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(connect=10.0, read=90.0, write=60.0, pool=30.0),
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
 
 ANALYSIS_PROMPT = """\
 You are an expert resume analyst and hiring consultant.
@@ -93,36 +145,132 @@ Scoring guide:
 """
 
 
-async def analyze_resume(
-    pdf_bytes: bytes,
-    job_description: str,
-    *,
-    from_url: bool = False,
-) -> AnalysisResult:
-    api_key = os.getenv("GEMINI_API_KEY", "")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY is not configured.")
+def _split_prompt(template: str, field: str) -> Tuple[str, str]:
+    """Split a ``str.format`` template around its single placeholder.
+
+    Lets each request build the prompt with plain concatenation instead of
+    re-parsing the whole template; the escaped braces are undone here once.
+    """
+    head, tail = (
+        part.replace("{{", "{").replace("}}", "}")
+        for part in template.split("{" + field + "}")
+    )
+    return head, tail
+
+
+_ANALYSIS_PROMPT_HEAD, _ANALYSIS_PROMPT_TAIL = _split_prompt(
+    ANALYSIS_PROMPT, "job_description"
+)
+_URL_PROMPT_HEAD, _URL_PROMPT_TAIL = _split_prompt(URL_ANALYSIS_PROMPT, "page_content")
+
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying after ``response`` on the given attempt."""
+    delay = _RETRY_BASE_DELAY * 2**attempt
+    try:
+        delay = max(delay, float(response.headers.get("Retry-After", 0)))
+    except ValueError:
+        pass  # HTTP-date form; fall back to plain backoff
+    return min(delay, _RETRY_MAX_DELAY) + random.uniform(0, 0.5)
+
+
+class _GeminiStatusError(ValueError):
+    """Gemini API error response; keeps the status code for callers."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Gemini API error ({status_code}): {message}")
+        self.status_code = status_code
+
+
+def _raise_for_gemini_status(response: httpx.Response) -> None:
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError as exc:
+        # Surface the actual Gemini API error message
+        try:
+            detail = exc.response.json()
+            msg = detail.get("error", {}).get("message", str(exc))
+        except Exception:
+            msg = str(exc)
+        raise _GeminiStatusError(exc.response.status_code, msg) from exc
 
-    pdf_b64 = base64.b64encode(pdf_bytes).decode("utf-8")
 
+async def _post_with_retry(url: str, **kwargs) -> httpx.Response:
+    """POST to the Gemini API, retrying transient failures, and raise on error."""
+    client = _client or await init_client()
+    for attempt in range(GEMINI_MAX_ATTEMPTS):
+        response = await client.post(url, **kwargs)
+        if (
+            response.status_code not in _RETRYABLE_STATUS
+            or attempt == GEMINI_MAX_ATTEMPTS - 1
+        ):
+            break
+        delay = _retry_delay(response, attempt)
+        logger.warning(
+            "Gemini API returned %d, retrying in %.1fs (attempt %d/%d)",
+            response.status_code, delay, attempt + 1, GEMINI_MAX_ATTEMPTS,
+        )
+        await asyncio.sleep(delay)
+
+    _raise_for_gemini_status(response)
+    return response
+
+
+async def upload_pdf(pdf_bytes: bytes) -> str:
+    """Upload a PDF to the Gemini Files API and return its file URI.
+
+    Uses the resumable protocol: a start request that returns a session URL,
+    then a single upload+finalize request carrying the raw bytes.
+    """
+    start = await _post_with_retry(
+        f"{GEMINI_UPLOAD_URL}?key={GEMINI_API_KEY}",
+        content=orjson.dumps({"file": {"display_name": "resume.pdf"}}),
+        headers={
+            "Content-Type": "application/json",
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(len(pdf_bytes)),
+            "X-Goog-Upload-Header-Content-Type": "application/pdf",
+        },
+    )
+    upload_url = start.headers.get("X-Goog-Upload-URL")
+    if not upload_url:
+        raise ValueError("Gemini Files API did not return an upload URL.")
+
+    response = await _post_with_retry(
+        upload_url,
+        content=pdf_bytes,
+        headers={
+            "X-Goog-Upload-Offset": "0",
+            "X-Goog-Upload-Command": "upload, finalize",
+        },
+    )
+    try:
+        return orjson.loads(response.content)["file"]["uri"]
+    except (KeyError, TypeError, orjson.JSONDecodeError) as exc:
+        raise ValueError(f"Unexpected response from Gemini Files API: {exc}") from exc
+
+
+async def _upload_cached(digest: str, pdf_bytes: bytes) -> str:
+    """Upload ``pdf_bytes`` and remember its file URI under ``digest``."""
+    file_uri = await upload_pdf(pdf_bytes)
+    _file_uri_cache[digest] = file_uri
+    return file_uri
+
+
+async def _generate_content(file_uri: str, prompt: str) -> httpx.Response:
     payload = {
         "contents": [
             {
                 "role": "user",
                 "parts": [
                     {
-                        "inline_data": {
+                        "file_data": {
                             "mime_type": "application/pdf",
-                            "data": pdf_b64,
+                            "file_uri": file_uri,
                         }
                     },
-                    {
-                        "text": (
-                            URL_ANALYSIS_PROMPT.format(page_content=job_description)
-                            if from_url
-                            else ANALYSIS_PROMPT.format(job_description=job_description)
-                        )
-                    },
+                    {"text": prompt},
                 ],
             }
         ],
@@ -132,28 +280,51 @@ async def analyze_resume(
         },
     }
 
-    async with httpx.AsyncClient(timeout=90.0) as client:
-        response = await client.post(
-            f"{GEMINI_URL}?key={api_key}",
-            json=payload,
-        )
-        try:
-            response.raise_for_status()
-        except httpx.HTTPStatusError as exc:
-            # Surface the actual Gemini API error message
-            try:
-                detail = exc.response.json()
-                msg = detail.get("error", {}).get("message", str(exc))
-            except Exception:
-                msg = str(exc)
-            raise ValueError(f"Gemini API error ({exc.response.status_code}): {msg}") from exc
-
-    data = response.json()
+    return await _post_with_retry(
+        _GEMINI_ENDPOINT,
+        content=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+    )
+
+
+async def analyze_resume(
+    pdf_bytes: bytes,
+    job_description: str,
+    *,
+    from_url: bool = False,
+) -> AnalysisResult:
+    prompt = (
+        _URL_PROMPT_HEAD + job_description + _URL_PROMPT_TAIL
+        if from_url
+        else _ANALYSIS_PROMPT_HEAD + job_description + _ANALYSIS_PROMPT_TAIL
+    )
+
+    digest = await asyncio.to_thread(lambda: hashlib.sha256(pdf_bytes).hexdigest())
+    file_uri = _file_uri_cache.get(digest)
+    from_cache = file_uri is not None
+    if not from_cache:
+        file_uri = await _upload_cached(digest, pdf_bytes)
+
+    try:
+        response = await _generate_content(file_uri, prompt)
+    except _GeminiStatusError as exc:
+        if not 400 <= exc.status_code < 500 or exc.status_code in _RETRYABLE_STATUS:
+            raise
+        # Google may delete an upload before it expires; never reuse a
+        # URI Gemini has rejected, and re-upload once if it came from cache
+        _file_uri_cache.pop(digest, None)
+        if not from_cache:
+            raise
+        logger.warning("Cached Gemini file rejected (%d), re-uploading", exc.status_code)
+        file_uri = await _upload_cached(digest, pdf_bytes)
+        response = await _generate_content(file_uri, prompt)
+
+    data = orjson.loads(response.content)
 
     try:
         text = data["candidates"][0]["content"]["parts"][0]["text"]
-        result = json.loads(text)
-    except (KeyError, IndexError, json.JSONDecodeError) as exc:
+        result = orjson.loads(text)
+    except (KeyError, IndexError, orjson.JSONDecodeError) as exc:
         raise ValueError(f"Unexpected response from Gemini API: {exc}") from exc
 
     return AnalysisResult(
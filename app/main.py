@@ -1,73 +1,179 @@
-import json
+import asyncio
 import logging
 import os
 import uuid
 from contextlib import asynccontextmanager
 from datetime import date
+from typing import BinaryIO
 
 logger = logging.getLogger(__name__)
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+import orjson
+import redis.asyncio as redis
+from fastapi import BackgroundTasks, FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from slowapi import Limiter
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .database import Base, SessionLocal, engine
-from .gemini import analyze_resume
+from .gemini import analyze_resume, close_client, init_client
 from .models import Analysis, DailyUsage
-from .scraper import ScrapeError, scrape_job_listing
+from .scraper import (
+    ScrapeError,
+    close_browser,
+    close_http_client,
+    init_browser,
+    init_http_client,
+    scrape_job_listing,
+)
 
 TEMPLATES_DIR = "app/templates"
-MAX_PDF_BYTES = 20 * 1024 * 1024  # 20 MB (Gemini inline limit)
+# Templates are compiled once per process; set to 1 when editing them locally
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "0") == "1"
+MAX_PDF_BYTES = 20 * 1024 * 1024  # 20 MB
 MIN_JOB_DESC_CHARS = 50
 
+# /result may be requested before the background insert has committed
+RESULT_LOOKUP_ATTEMPTS = 5
+RESULT_LOOKUP_DELAY = 0.1  # seconds
+
 # --- Rate limiting ---
 RATE_LIMIT_PER_IP = os.getenv("RATE_LIMIT_PER_IP", "5/hour")
 DAILY_ANALYSIS_CAP = int(os.getenv("DAILY_ANALYSIS_CAP", "150"))
 
-limiter = Limiter(key_func=get_remote_address)
+# Per-IP counters live in Redis so every worker enforces the same limit.
+# Without it each worker counts separately, multiplying the effective limit.
+REDIS_URL = os.getenv("REDIS_URL", "")
+
+if REDIS_URL:
+    limiter = Limiter(
+        key_func=get_remote_address,
+        storage_uri=REDIS_URL,
+        in_memory_fallback_enabled=True,
+    )
+else:
+    logger.warning(
+        "REDIS_URL not set; rate limits are tracked per worker process in memory"
+    )
+    limiter = Limiter(key_func=get_remote_address)
+
 
+def _read_pdf(file: BinaryIO) -> bytes:
+    """Read an uploaded PDF, never pulling more than the size limit into memory."""
+    data = file.read(MAX_PDF_BYTES + 1)
+    if len(data) > MAX_PDF_BYTES:
+        raise HTTPException(status_code=400, detail="PDF must be under 20 MB.")
 
-async def _check_daily_cap():
-    """Raise 429 if the global daily analysis cap has been reached."""
+    if not data:
+        raise HTTPException(status_code=400, detail="Uploaded PDF is empty.")
+
+    return data
+
+
+# Built once with bound parameters so every request reuses the same SQL
+# text and asyncpg's prepared statement for it. The bind can't be called
+# "usage_date": SQLAlchemy reserves column names for SET/VALUES params.
+_RESERVE_SLOT_STMT = (
+    insert(DailyUsage)
+    .values(usage_date=bindparam("b_usage_date"), count=1)
+    .on_conflict_do_update(
+        index_elements=[DailyUsage.usage_date],
+        set_={"count": DailyUsage.count + 1},
+        where=DailyUsage.count < DAILY_ANALYSIS_CAP,
+    )
+    .returning(DailyUsage.count)
+)
+_RELEASE_SLOT_STMT = (
+    update(DailyUsage)
+    .where(DailyUsage.usage_date == bindparam("b_usage_date"))
+    .values(count=DailyUsage.count - 1)
+    .execution_options(synchronize_session=False)
+)
+
+
+async def _reserve_daily_slot(session: AsyncSession) -> date:
+    """Atomically claim one of today's analysis slots.
+
+    The conditional upsert only increments while the count is below the cap,
+    so concurrent requests can never push usage past it. Raises 429 if the
+    cap has been reached; returns the date the slot was claimed for.
+    """
     today = date.today()
-    async with SessionLocal() as session:
-        usage = await session.get(DailyUsage, today)
-    if usage and usage.count >= DAILY_ANALYSIS_CAP:
+    result = await session.execute(_RESERVE_SLOT_STMT, {"b_usage_date": today})
+    count = result.scalar_one_or_none()
+    await session.commit()
+    if count is None:
         raise HTTPException(
             status_code=429,
             detail="Daily analysis limit reached. Please try again tomorrow.",
         )
+    return today
 
 
-async def _increment_daily_counter():
-    today = date.today()
-    async with SessionLocal() as session:
-        usage = await session.get(DailyUsage, today)
-        if usage:
-            usage.count += 1
-        else:
-            session.add(DailyUsage(usage_date=today, count=1))
+async def _release_daily_slot(session: AsyncSession, usage_date: date):
+    """Give back a slot claimed by ``_reserve_daily_slot`` after a failed analysis."""
+    try:
+        await session.execute(_RELEASE_SLOT_STMT, {"b_usage_date": usage_date})
         await session.commit()
+    except Exception:
+        logger.exception("Failed to release daily analysis slot")
+
+
+async def _persist_analysis(analysis: Analysis):
+    """Insert a completed analysis; run as a background task after redirecting."""
+    try:
+        async with SessionLocal() as session:
+            session.add(analysis)
+            await session.commit()
+    except Exception:
+        logger.exception("Failed to persist analysis %s", analysis.id)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # Shared Redis connection pool for anything else that wants to use it
+    app.state.redis = redis.from_url(REDIS_URL) if REDIS_URL else None
+    await init_client()
+    await init_http_client()
+    try:
+        await init_browser()
+    except Exception:
+        # Scrapes will retry the launch on demand
+        logger.exception("Failed to launch Playwright browser at startup")
     yield
+    await close_browser()
+    await close_http_client()
+    await close_client()
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
 
 
 app = FastAPI(title="ResuMatch", lifespan=lifespan)
 app.state.limiter = limiter
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
-templates = Jinja2Templates(directory=TEMPLATES_DIR)
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=True,
+        auto_reload=TEMPLATES_AUTO_RELOAD,
+        bytecode_cache=FileSystemBytecodeCache(),
+    )
+)
+# Compile every template up front so the first request doesn't pay for it
+for _name in templates.env.list_templates():
+    templates.get_template(_name)
 
 
 # ---------------------------------------------------------------------------
@@ -80,7 +186,7 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     detail = "Rate limit exceeded. Please slow down and try again later."
     if request.headers.get("HX-Request"):
         return Response(
-            content=json.dumps({"detail": detail}),
+            content=orjson.dumps({"detail": detail}),
             status_code=429,
             media_type="application/json",
         )
@@ -96,7 +202,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     """Return HTML error responses for HTMX requests, JSON for others."""
     if request.headers.get("HX-Request"):
         return Response(
-            content=json.dumps({"detail": exc.detail}),
+            content=orjson.dumps({"detail": exc.detail}),
             status_code=exc.status_code,
             media_type="application/json",
         )
@@ -121,84 +227,91 @@ async def index(request: Request):
 @limiter.limit(RATE_LIMIT_PER_IP)
 async def analyze(
     request: Request,
+    background_tasks: BackgroundTasks,
     resume: UploadFile = File(...),
     job_description: str = Form(""),
     job_url: str = Form(""),
     input_mode: str = Form("paste"),
 ):
-    # --- Check global daily cap ---
-    await _check_daily_cap()
-
     # --- Validate resume ---
     if not resume.filename or not resume.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted.")
 
-    pdf_bytes = await resume.read()
-
-    if len(pdf_bytes) > MAX_PDF_BYTES:
-        raise HTTPException(status_code=400, detail="PDF must be under 20 MB.")
-
-    if len(pdf_bytes) == 0:
-        raise HTTPException(status_code=400, detail="Uploaded PDF is empty.")
-
-    # --- Validate & prepare job content based on input mode ---
-    from_url = input_mode == "url"
-    source_url = None
-
-    if from_url:
-        job_url = job_url.strip()
-        if not job_url:
-            raise HTTPException(status_code=400, detail="Please provide a job listing URL.")
-
-        try:
-            content_for_gemini = await scrape_job_listing(job_url)
-        except ScrapeError as exc:
-            raise HTTPException(status_code=400, detail=str(exc)) from exc
-        except Exception as exc:
-            logger.exception("Unexpected error scraping URL: %s", job_url)
-            raise HTTPException(
-                status_code=400,
-                detail="Could not fetch content from the provided URL. Please paste the job description manually.",
-            ) from exc
-
-        source_url = job_url
-    else:
-        if len(job_description.strip()) < MIN_JOB_DESC_CHARS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Job description must be at least {MIN_JOB_DESC_CHARS} characters.",
-            )
-        content_for_gemini = job_description.strip()
-
-    # --- Call Gemini ---
-    try:
-        result = await analyze_resume(pdf_bytes, content_for_gemini, from_url=from_url)
-    except ValueError as exc:
-        raise HTTPException(status_code=502, detail=str(exc)) from exc
-    except Exception as exc:
-        logger.exception("Unexpected error during resume analysis")
-        raise HTTPException(
-            status_code=502,
-            detail="Analysis failed due to an upstream error. Please try again.",
-        ) from exc
-
-    await _increment_daily_counter()
-
-    # --- Persist to DB ---
-    analysis_id = str(uuid.uuid4())
     async with SessionLocal() as session:
-        analysis = Analysis(
-            id=analysis_id,
-            resume_filename=resume.filename,
-            job_description=job_description.strip() if not from_url else "[Scraped from URL]",
-            job_url=source_url,
-            score=result.score,
-            summary=result.summary,
-            strengths=json.dumps(result.strengths),
-            weaknesses=json.dumps(result.weaknesses),
+        # --- Claim a daily cap slot while the upload is read ---
+        # Reading up to 20 MB runs in a thread so it doesn't stall the event
+        # loop, and overlaps with the database round-trip.
+        reserved, pdf_bytes = await asyncio.gather(
+            _reserve_daily_slot(session),
+            asyncio.to_thread(_read_pdf, resume.file),
+            return_exceptions=True,
         )
-        session.add(analysis)
-        await session.commit()
+        if isinstance(reserved, BaseException):
+            raise reserved
+        usage_date = reserved
+
+        # Any failure before the analysis is persisted gives the slot back
+        try:
+            if isinstance(pdf_bytes, BaseException):
+                raise pdf_bytes
+
+            # --- Validate & prepare job content based on input mode ---
+            from_url = input_mode == "url"
+            source_url = None
+
+            if from_url:
+                job_url = job_url.strip()
+                if not job_url:
+                    raise HTTPException(status_code=400, detail="Please provide a job listing URL.")
+
+                try:
+                    content_for_gemini = await scrape_job_listing(job_url)
+                except ScrapeError as exc:
+                    raise HTTPException(status_code=400, detail=str(exc)) from exc
+                except Exception as exc:
+                    logger.exception("Unexpected error scraping URL: %s", job_url)
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Could not fetch content from the provided URL. Please paste the job description manually.",
+                    ) from exc
+
+                source_url = job_url
+            else:
+                if len(job_description.strip()) < MIN_JOB_DESC_CHARS:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Job description must be at least {MIN_JOB_DESC_CHARS} characters.",
+                    )
+                content_for_gemini = job_description.strip()
+
+            # --- Call Gemini ---
+            try:
+                result = await analyze_resume(pdf_bytes, content_for_gemini, from_url=from_url)
+            except ValueError as exc:
+                raise HTTPException(status_code=502, detail=str(exc)) from exc
+            except Exception as exc:
+                logger.exception("Unexpected error during resume analysis")
+                raise HTTPException(
+                    status_code=502,
+                    detail="Analysis failed due to an upstream error. Please try again.",
+                ) from exc
+        except Exception:
+            await _release_daily_slot(session, usage_date)
+            raise
+
+    # --- Persist to DB (after the response is sent) ---
+    analysis_id = uuid.uuid4()
+    analysis = Analysis(
+        id=analysis_id,
+        resume_filename=resume.filename,
+        job_description=job_description.strip() if not from_url else "[Scraped from URL]",
+        job_url=source_url,
+        score=result.score,
+        summary=result.summary,
+        strengths=result.strengths,
+        weaknesses=result.weaknesses,
+    )
+    background_tasks.add_task(_persist_analysis, analysis)
 
     # --- Respond ---
     # For HTMX requests: 204 + HX-Redirect causes the browser to navigate.
@@ -215,8 +328,18 @@ async def analyze(
 
 @app.get("/result/{analysis_id}", response_class=HTMLResponse)
 async def result(request: Request, analysis_id: str):
-    async with SessionLocal() as session:
-        analysis = await session.get(Analysis, analysis_id)
+    try:
+        analysis_uuid = uuid.UUID(analysis_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Analysis not found.")
+
+    for attempt in range(RESULT_LOOKUP_ATTEMPTS):
+        # Fresh session per attempt so no pooled connection is held while waiting
+        async with SessionLocal() as session:
+            analysis = await session.get(Analysis, analysis_uuid)
+        if analysis or attempt == RESULT_LOOKUP_ATTEMPTS - 1:
+            break
+        await asyncio.sleep(RESULT_LOOKUP_DELAY)
 
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found.")
@@ -226,7 +349,7 @@ async def result(request: Request, analysis_id: str):
         {
             "request": request,
             "analysis": analysis,
-            "strengths": json.loads(analysis.strengths),
-            "weaknesses": json.loads(analysis.weaknesses),
+            "strengths": analysis.strengths,
+            "weaknesses": analysis.weaknesses,
         },
     )
@@ -1,8 +1,9 @@
 import uuid
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Optional
 
 from sqlalchemy import String, Integer, Text, DateTime, Date
+from sqlalchemy.dialects.postgresql import JSONB, UUID as PG_UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .database import Base
@@ -11,8 +12,8 @@ from .database import Base
 class Analysis(Base):
     __tablename__ = "analyses"
 
-    id: Mapped[str] = mapped_column(
-        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    id: Mapped[uuid.UUID] = mapped_column(
+        PG_UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow
@@ -22,9 +23,8 @@ class Analysis(Base):
     job_url: Mapped[Optional[str]] = mapped_column(String(2048), nullable=True)
     score: Mapped[int] = mapped_column(Integer)
     summary: Mapped[str] = mapped_column(Text)
-    # Stored as JSON arrays
-    strengths: Mapped[str] = mapped_column(Text)
-    weaknesses: Mapped[str] = mapped_column(Text)
+    strengths: Mapped[List[str]] = mapped_column(JSONB)
+    weaknesses: Mapped[List[str]] = mapped_column(JSONB)
 
 
 class DailyUsage(Base):
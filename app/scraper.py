@@ -1,9 +1,13 @@
+import asyncio
 import logging
+import os
 import re
-from urllib.parse import urlparse
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlparse
 
 import httpx
-from bs4 import BeautifulSoup
+from cachetools import TTLCache
+from selectolax.lexbor import LexborHTMLParser
 
 logger = logging.getLogger(__name__)
 
@@ -13,8 +17,26 @@ MIN_CONTENT_LENGTH = 100
 # Maximum characters to return (keeps Gemini token usage reasonable)
 MAX_CONTENT_LENGTH = 50_000
 
+# Maximum characters of HTML to parse; real job pages are far smaller
+MAX_HTML_LENGTH = 2_000_000
+
 STATIC_TIMEOUT = 15.0  # seconds
 PLAYWRIGHT_TIMEOUT = 30_000  # milliseconds
+# How long to wait for a job-description container after the DOM is ready
+PLAYWRIGHT_SELECTOR_TIMEOUT = 3_000  # milliseconds
+
+_CONTENT_SELECTOR = "main, article, [class*='job'], [class*='description']"
+# Assets that never contribute text; aborting them keeps page loads short
+_BLOCKED_ASSETS = "**/*.{png,jpg,jpeg,gif,webp,svg,woff,woff2,ttf,mp4,webm}"
+
+# Scraped text is reused for repeat submissions of the same listing
+SCRAPE_CACHE_TTL = 3600  # seconds
+SCRAPE_CACHE_SIZE = 512
+
+# Query parameters that only carry campaign tracking, ignored for caching
+_TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid"}
+
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
 
 _USER_AGENT = (
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
@@ -22,6 +44,7 @@ _USER_AGENT = (
 )
 
 try:
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
     from playwright.async_api import async_playwright
 
     PLAYWRIGHT_AVAILABLE = True
@@ -36,6 +59,87 @@ class ScrapeError(Exception):
     """Raised when scraping fails completely."""
 
 
+# Shared connection pool for static fetches. Created and closed by the
+# FastAPI lifespan in main.py, alongside the browser below.
+_http: Optional[httpx.AsyncHTTPTransport] = None
+
+
+async def init_http_client() -> httpx.AsyncHTTPTransport:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _http
+
+
+async def close_http_client() -> None:
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+
+# One Chromium instance is shared across requests; each scrape gets its own
+# browser context. Every context costs ~50-100 MB, so cap how many run at once.
+PLAYWRIGHT_CONCURRENCY = int(os.getenv("PLAYWRIGHT_CONCURRENCY", "2"))
+
+_playwright = None
+_browser = None
+# Both are created on first use so they bind to the running event loop
+# (on Python 3.9 asyncio primitives bind to the loop current at creation).
+_playwright_sem: Optional[asyncio.Semaphore] = None
+# Serialises launches so concurrent scrapes can't each start (and leak) a
+# driver or browser.
+_browser_lock: Optional[asyncio.Lock] = None
+
+
+def _get_playwright_sem() -> asyncio.Semaphore:
+    global _playwright_sem
+    if _playwright_sem is None:
+        _playwright_sem = asyncio.Semaphore(PLAYWRIGHT_CONCURRENCY)
+    return _playwright_sem
+
+
+def _browser_ready() -> bool:
+    return _browser is not None and _browser.is_connected()
+
+
+async def init_browser():
+    """Launch the shared headless browser (or relaunch it if it has died)."""
+    global _playwright, _browser, _browser_lock
+    if not PLAYWRIGHT_AVAILABLE:
+        return None
+    if _browser_ready():
+        return _browser
+
+    if _browser_lock is None:
+        _browser_lock = asyncio.Lock()
+    async with _browser_lock:
+        # Another scrape may have launched it while we waited for the lock
+        if not _browser_ready():
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            _browser = await _playwright.chromium.launch(headless=True)
+    return _browser
+
+
+async def close_browser() -> None:
+    global _playwright, _browser
+    if _browser is not None:
+        await _browser.close()
+        _browser = None
+    if _playwright is not None:
+        await _playwright.stop()
+        _playwright = None
+
+
+# Maps normalised URL -> scrape task. Storing the task rather than its
+# result lets concurrent requests for the same URL share a single fetch.
+_scrape_cache: TTLCache = TTLCache(maxsize=SCRAPE_CACHE_SIZE, ttl=SCRAPE_CACHE_TTL)
+
+
 def _validate_url(url: str) -> str:
     """Validate and normalise the URL. Returns cleaned URL or raises ScrapeError."""
     url = url.strip()
@@ -51,57 +155,95 @@ def _validate_url(url: str) -> str:
     return url
 
 
+def _cache_key(url: str) -> str:
+    """Normalise a validated URL so trivially different links share a cache entry."""
+    parsed = urlparse(url)
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith("utm_")
+    ]
+    return parsed._replace(
+        scheme=parsed.scheme.lower(),
+        netloc=parsed.netloc.lower(),
+        query=urlencode(query),
+        # Fragments never reach the server, so they don't change the page
+        fragment="",
+    ).geturl()
+
+
 def _extract_text_from_html(html: str) -> str:
-    """Parse HTML with BeautifulSoup, strip boilerplate, return text."""
-    soup = BeautifulSoup(html, "lxml")
+    """Parse HTML with selectolax, strip boilerplate, return text."""
+    tree = LexborHTMLParser(html[:MAX_HTML_LENGTH])
 
     # Remove elements that are unlikely to contain job description content
-    for tag in soup.find_all(["script", "style", "nav", "footer", "header", "noscript"]):
+    for tag in tree.css("script, style, nav, footer, header, noscript"):
         tag.decompose()
 
-    text = soup.get_text(separator="\n", strip=True)
+    root = tree.body or tree.root
+    text = root.text(separator="\n", strip=True) if root else ""
 
     # Collapse runs of blank lines into a single newline
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text)
 
     return text[:MAX_CONTENT_LENGTH]
 
 
 async def _fetch_static(url: str) -> str:
-    """Fetch URL with httpx, parse with BeautifulSoup, return extracted text."""
-    async with httpx.AsyncClient(
+    """Fetch URL with httpx, parse with selectolax, return extracted text."""
+    # A client per fetch gives each scrape its own cookie jar: cookies set
+    # during its redirect chain are kept, then dropped instead of leaking
+    # into other users' scrapes. Only the pooled transport is shared, so the
+    # client is deliberately not closed (that would close the transport).
+    client = httpx.AsyncClient(
+        transport=_http or await init_http_client(),
         timeout=STATIC_TIMEOUT,
         follow_redirects=True,
         headers={"User-Agent": _USER_AGENT},
-    ) as client:
-        response = await client.get(url)
-        response.raise_for_status()
+    )
+    response = await client.get(url)
+    response.raise_for_status()
+
+    html = response.text
+    # A page this small can't hold enough text once markup is stripped
+    # (typically a JS app shell), so skip parsing and let Playwright handle it
+    if len(html) < MIN_CONTENT_LENGTH * 2:
+        logger.info("Static response for %s too small to parse (%d chars)", url, len(html))
+        return ""
 
-    return _extract_text_from_html(response.text)
+    return _extract_text_from_html(html)
 
 
 async def _fetch_with_playwright(url: str) -> str:
     """Fetch URL with Playwright (headless Chromium), return extracted text."""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
+    async with _get_playwright_sem():
+        browser = await init_browser()
+        context = await browser.new_context(user_agent=_USER_AGENT)
         try:
-            page = await browser.new_page(user_agent=_USER_AGENT)
-            await page.goto(url, wait_until="networkidle", timeout=PLAYWRIGHT_TIMEOUT)
+            await context.route(_BLOCKED_ASSETS, lambda route: route.abort())
+            page = await context.new_page()
+            await page.goto(url, wait_until="domcontentloaded", timeout=PLAYWRIGHT_TIMEOUT)
+            try:
+                await page.wait_for_selector(
+                    _CONTENT_SELECTOR, timeout=PLAYWRIGHT_SELECTOR_TIMEOUT
+                )
+            except PlaywrightTimeoutError:
+                pass  # take whatever has rendered so far
             html = await page.content()
         finally:
-            await browser.close()
+            await context.close()
 
     return _extract_text_from_html(html)
 
 
-async def scrape_job_listing(url: str) -> str:
-    """Scrape a job listing URL.
+def _evict_failed(key: str, task: asyncio.Future) -> None:
+    """Drop failed scrapes from the cache so the next request retries."""
+    if (task.cancelled() or task.exception() is not None) and _scrape_cache.get(key) is task:
+        _scrape_cache.pop(key, None)
 
-    Tries a static fetch first, then falls back to Playwright for JS-heavy
-    pages.  Raises ``ScrapeError`` if both approaches fail.
-    """
-    url = _validate_url(url)
 
+async def _scrape(url: str) -> str:
+    """Run the static fetch, falling back to Playwright if it comes up short."""
     # --- Attempt 1: static fetch ---
     try:
         text = await _fetch_static(url)
@@ -139,3 +281,25 @@ async def scrape_job_listing(url: str) -> str:
             "Could not fetch job listing from the provided URL. "
             "Please paste the job description manually instead."
         ) from exc
+
+
+async def scrape_job_listing(url: str) -> str:
+    """Scrape a job listing URL.
+
+    Tries a static fetch first, then falls back to Playwright for JS-heavy
+    pages.  Raises ``ScrapeError`` if both approaches fail.  Successful
+    results are cached for ``SCRAPE_CACHE_TTL`` seconds.
+    """
+    url = _validate_url(url)
+    key = _cache_key(url)
+
+    task = _scrape_cache.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_scrape(url))
+        _scrape_cache[key] = task
+        task.add_done_callback(lambda t: _evict_failed(key, t))
+    else:
+        logger.info("Scrape cache hit for %s", url)
+
+    # Shield so one cancelled request doesn't abort a fetch others are awaiting
+    return await asyncio.shield(task)